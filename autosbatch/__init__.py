@@ -4,6 +4,7 @@ import logging
 
 from rich.logging import RichHandler
 
+from autosbatch.async_pool import AsyncSlurmPool
 from autosbatch.autosbatch import SlurmPool
 
 logging.basicConfig(
@@ -0,0 +1,571 @@
+"""Asyncio version of SlurmPool, for embedding in async services."""
+
+import asyncio
+import functools
+import getpass
+import logging
+import random
+import re
+from asyncio.subprocess import PIPE
+from typing import Dict, List, Optional, Sequence, Union
+
+from autosbatch.autosbatch import SlurmPool
+from autosbatch.logs import LogAggregator
+from autosbatch.scores import NodeScores
+
+
+async def _exec(command: List[str], check: bool) -> str:
+    """Run a command, killing the process if the coroutine is cancelled."""
+    proc = await asyncio.create_subprocess_exec(*command, stdout=PIPE, stderr=PIPE)
+    try:
+        stdout, stderr = await proc.communicate()
+    except asyncio.CancelledError:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    if check and proc.returncode != 0:
+        raise RuntimeError(f"{command[0]} failed: {stderr.decode().strip()}")
+    return stdout.decode()
+
+
+async def _run(
+    command: List[str],
+    semaphore: Optional[asyncio.Semaphore] = None,
+    check: bool = False,
+) -> str:
+    """
+    Run a command without blocking the event loop.
+
+    The process is killed if the coroutine is cancelled.
+
+    Parameters
+    ----------
+    command : List[str]
+        Command to run
+    semaphore : asyncio.Semaphore, optional
+        Semaphore bounding the number of concurrent processes, by default None
+    check : bool, optional
+        Raise RuntimeError if the command fails, by default False
+
+    Returns
+    -------
+    str
+        Stdout of the command
+    """
+    if semaphore is None:
+        return await _exec(command, check)
+    async with semaphore:
+        return await _exec(command, check)
+
+
+class AsyncSlurmPool(SlurmPool):
+    """
+    A class for submitting jobs to Slurm from asyncio code.
+
+    Create it with ``await AsyncSlurmPool.create(...)``, which queries sinfo and
+    scontrol without blocking the event loop.
+
+    ``single_submit``, ``multi_submit``, ``map``, ``starmap``, ``plan``,
+    ``status``, ``wait``, ``cancel`` and ``clean`` are coroutines. ``close`` and
+    the static helpers inherited from ``SlurmPool`` do no I/O and are safe to
+    call; ``get_nodes`` would block and raises, use ``aget_nodes`` instead.
+    """
+
+    # runs created within the same second should not share a directory
+    time_format = "%m%d%H%M%S%f"
+
+    def __init__(
+        self,
+        nodes: Dict,
+        hyperthreading: Dict[str, bool],
+        pool_size: Optional[int] = None,
+        ncpus_per_job: int = 1,
+        max_jobs_per_node: Optional[int] = None,
+        node_list: Optional[List[str]] = None,
+        partition: Optional[str] = None,
+        max_pool_size: int = 1000,
+        use_scores: bool = False,
+        max_concurrency: int = 8,
+        semaphore: Optional[asyncio.Semaphore] = None,
+        scores: Optional[NodeScores] = None,
+    ):
+        """
+        Initialize an AsyncSlurmPool object from queried nodes, see ``create``.
+
+        Parameters
+        ----------
+        nodes : Dict
+            Information of nodes, as returned by ``aget_nodes``
+        hyperthreading : Dict[str, bool]
+            Whether hyperthreading is enabled on each node
+        max_concurrency : int, optional
+            Maximum number of slurm commands run at the same time by this pool,
+            by default 8
+        semaphore : asyncio.Semaphore, optional
+            Semaphore shared by several pools to bound their slurm commands
+            together, replaces ``max_concurrency``, by default None
+        scores : NodeScores, optional
+            Node scores already loaded, used with ``use_scores``, by default
+            loaded from the default path
+
+        Other parameters are the same as ``SlurmPool``.
+        """
+        self.ncpus_per_job = ncpus_per_job
+        self.logger = logging.getLogger("autosbatch")
+        self.nodes = nodes
+        self.hyperthreading = hyperthreading
+        self.semaphore = semaphore or asyncio.Semaphore(max_concurrency)
+        self.slurm_ids: Dict[str, str] = {}
+        self._init_pool(
+            pool_size=pool_size,
+            max_jobs_per_node=max_jobs_per_node,
+            node_list=node_list,
+            partition=partition,
+            max_pool_size=max_pool_size,
+            scores=(scores or NodeScores()) if use_scores else None,
+        )
+
+    @classmethod
+    async def create(
+        cls,
+        pool_size: Optional[int] = None,
+        ncpus_per_job: int = 1,
+        max_jobs_per_node: Optional[int] = None,
+        node_list: Optional[List[str]] = None,
+        partition: Optional[str] = None,
+        max_pool_size: int = 1000,
+        use_scores: bool = False,
+        max_concurrency: int = 8,
+        semaphore: Optional[asyncio.Semaphore] = None,
+    ) -> "AsyncSlurmPool":
+        """
+        Query nodes and create an AsyncSlurmPool object.
+
+        Parameters are the same as ``__init__``.
+
+        Returns
+        -------
+        AsyncSlurmPool
+            Pool ready to submit jobs
+        """
+        nodes, hyperthreading = await asyncio.gather(
+            cls.aget_nodes(semaphore=semaphore),
+            cls._aget_hyperthreading(semaphore=semaphore),
+        )
+        scores = await cls._in_thread(NodeScores) if use_scores else None
+        return cls(
+            nodes,
+            hyperthreading,
+            pool_size=pool_size,
+            ncpus_per_job=ncpus_per_job,
+            max_jobs_per_node=max_jobs_per_node,
+            node_list=node_list,
+            partition=partition,
+            max_pool_size=max_pool_size,
+            use_scores=use_scores,
+            max_concurrency=max_concurrency,
+            semaphore=semaphore,
+            scores=scores,
+        )
+
+    @classmethod
+    async def aget_nodes(
+        cls, sortByload=True, semaphore: Optional[asyncio.Semaphore] = None
+    ) -> Dict:
+        """
+        Get nodes information from sinfo.
+
+        Parameters
+        ----------
+        sortByload : bool, optional
+            Sort nodes by load, by default True
+        semaphore : asyncio.Semaphore, optional
+            Semaphore bounding the slurm commands, by default None
+
+        Returns
+        -------
+        Dict
+            Information of nodes
+        """
+        stdout = await _run(cls.SINFO_COMMAND, semaphore)
+        return cls._parse_sinfo(stdout, sortByload=sortByload)
+
+    @classmethod
+    def get_nodes(cls, sortByload=True) -> Dict:
+        """Raise, since querying sinfo synchronously would block the event loop."""
+        raise RuntimeError(
+            "AsyncSlurmPool.get_nodes would block the event loop, use aget_nodes."
+        )
+
+    @classmethod
+    async def _aget_hyperthreading(
+        cls, semaphore: Optional[asyncio.Semaphore] = None
+    ) -> Dict[str, bool]:
+        """
+        Check if hyperthreading is enabled on every node, with a single scontrol call.
+
+        Parameters
+        ----------
+        semaphore : asyncio.Semaphore, optional
+            Semaphore bounding the slurm commands, by default None
+
+        Returns
+        -------
+        Dict[str, bool]
+            True if hyperthreading is enabled on the node, False otherwise
+        """
+        stdout = await _run(["scontrol", "show", "node"], semaphore)
+        hyperthreading = {}
+        for block in re.split(r"\n\s*\n", stdout):
+            match = re.search(r"NodeName=(\S+)", block)
+            if match:
+                hyperthreading[match.group(1)] = "ThreadsPerCore=2" in block
+        return hyperthreading
+
+    def _check_hypertreading(self, node_name) -> bool:
+        """
+        Check if hyperthreading is enabled, from the result queried by ``create``.
+
+        Parameters
+        ----------
+        node_name : str
+            Name of the node
+
+        Returns
+        -------
+        bool
+            True if hyperthreading is enabled, False otherwise
+        """
+        return self.hyperthreading.get(node_name, False)
+
+    @staticmethod
+    async def _in_thread(func, *args):
+        """Run a blocking function, such as file reads and writes, in the default executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args))
+
+    async def _sbatch(self, task_name: str, script_path: str) -> str:
+        """
+        Submit a script.
+
+        Parameters
+        ----------
+        task_name : str
+            Name of the task
+        script_path : str
+            Path of the script
+
+        Returns
+        -------
+        str
+            Slurm ID of the task
+        """
+        stdout = await _run(["sbatch", script_path], self.semaphore, check=True)
+        slurm_id = stdout.strip().split()[-1]
+        self.slurm_ids[task_name] = slurm_id
+        self.logger.info(f"Sumbitted Task: {task_name}. Slurm ID: {slurm_id}")
+        return slurm_id
+
+    async def single_submit(  # type: ignore[override]
+        self,
+        partition: str,
+        node: str,
+        cpus_per_task: int,
+        cmds: Union[str, List[str]],
+        job_name: str = "job",
+    ) -> str:
+        """
+        Submit a single job.
+
+        Parameters
+        ----------
+        partition : str
+            Partition to submit jobs to
+        node : str
+            Node to submit jobs to
+        cpus_per_task : int
+            Number of CPUs to use
+        cmds : str or List[str]
+            Commands to run
+        job_name : str, optional
+            Name of the job, by default 'job'
+
+        Returns
+        -------
+        str
+            Slurm ID of the job
+        """
+        if isinstance(cmds, str):
+            cmds = [cmds]
+        script_path = await self._in_thread(
+            self._write_script, partition, node, cpus_per_task, cmds, job_name
+        )
+        return await self._sbatch(job_name, script_path)
+
+    async def multi_submit(  # type: ignore[override]
+        self,
+        cmds: List[str],
+        job_name: str,
+        shuffle: bool = False,
+        sleep_time: float = 0.5,
+    ) -> Dict[str, str]:
+        """
+        Submit jobs to multiple nodes.
+
+        Submission stops at the first sbatch failure. On a failure or if
+        cancelled, the task log is written with the tasks already submitted,
+        which are then cancelled with scancel, and the exception is re-raised.
+
+        Parameters
+        ----------
+        cmds : List[str]
+            Commands to run
+        job_name : str
+            Name of the job
+        shuffle : bool, optional
+            Shuffle the commands, by default False
+        sleep_time : float, optional
+            Time between the start of each submission, by default 0.5
+
+        Returns
+        -------
+        Dict[str, str]
+            Slurm ID of each task
+        """
+        if shuffle:
+            random.shuffle(cmds)
+        _, tasks = self._prepare_tasks(cmds, job_name)
+        scripts = await self._in_thread(
+            lambda: [
+                self._write_script(
+                    self.nodes[node]["partition"],
+                    node,
+                    self.ncpus_per_job,
+                    cmds[start:end],
+                    task_name,
+                )
+                for task_name, node, start, end in tasks
+            ]
+        )
+        failed = asyncio.Event()
+
+        def _check(future: asyncio.Future):
+            if not future.cancelled() and future.exception() is not None:
+                failed.set()
+
+        pending = []
+        try:
+            for (task_name, _, _, _), script_path in zip(tasks, scripts):
+                if failed.is_set():
+                    break
+                future = asyncio.ensure_future(self._sbatch(task_name, script_path))
+                future.add_done_callback(_check)
+                pending.append(future)
+                await asyncio.sleep(sleep_time)
+            await asyncio.gather(*pending)
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            task_log = self._submitted(tasks, cmds, pending)
+            await self._in_thread(self._write_task_log, task_log, shuffle)
+            # only the tasks of this call, earlier calls may still be running
+            await self.cancel([v["slurm_id"] for v in task_log.values()])
+            raise
+        task_log = self._submitted(tasks, cmds, pending)
+        await self._in_thread(self._write_task_log, task_log, shuffle)
+        return {k: v["slurm_id"] for k, v in task_log.items()}
+
+    def _submitted(self, tasks: List, cmds: List[str], futures: List) -> Dict:
+        """
+        Build the task log of the tasks submitted by a ``multi_submit`` call.
+
+        Parameters
+        ----------
+        tasks : List
+            Name, node, start and end index of the commands of each task, as
+            returned by ``_prepare_tasks``
+        cmds : List[str]
+            Commands to run
+        futures : List[asyncio.Future]
+            sbatch call of each task, in the order of ``tasks``
+
+        Returns
+        -------
+        Dict
+            Entry of each task whose sbatch call succeeded
+        """
+        return {
+            task_name: self._task_entry(
+                task_name, node, cmds[start:end], future.result()
+            )
+            for (task_name, node, start, end), future in zip(tasks, futures)
+            if future.done() and not future.cancelled() and future.exception() is None
+        }
+
+    async def status(self) -> Dict[str, str]:
+        """
+        Get the state of the submitted tasks from squeue.
+
+        Returns
+        -------
+        Dict[str, str]
+            State of each task, e.g. PENDING or RUNNING, FINISHED once it has
+            left the queue
+        """
+        if not self.slurm_ids:
+            return {}
+        stdout = await _run(
+            ["squeue", "-h", "-o", "%i %T", "-u", getpass.getuser()],
+            self.semaphore,
+            check=True,
+        )
+        states = dict(line.split() for line in stdout.splitlines() if line.strip())
+        return {k: states.get(v, "FINISHED") for k, v in self.slurm_ids.items()}
+
+    async def wait(
+        self, poll_interval: float = 30.0, cancel_jobs: bool = False
+    ) -> LogAggregator:
+        """
+        Wait for all submitted tasks to finish.
+
+        The task logs are read incrementally while waiting. A failed squeue
+        call is logged and retried on the next poll, so a transient slurm error
+        does not end the wait.
+
+        Parameters
+        ----------
+        poll_interval : float, optional
+            Time between polls of squeue, by default 30.0
+        cancel_jobs : bool, optional
+            Cancel the tasks with scancel if the wait is cancelled, by default False
+
+        Returns
+        -------
+        LogAggregator
+            Aggregated logs of the run, e.g. ``failed()`` for failed commands
+        """
+        aggregator = await self._in_thread(LogAggregator, self.file_dir)
+        try:
+            while True:
+                try:
+                    states: Optional[Dict[str, str]] = await self.status()
+                except (RuntimeError, OSError) as e:
+                    self.logger.warning(f"{e}, retrying in {poll_interval}s.")
+                    states = None
+                if states is not None:
+                    queued = {
+                        self.slurm_ids[k] for k, v in states.items() if v != "FINISHED"
+                    }
+                    await self._in_thread(aggregator.update_queue, queued)
+                await self._in_thread(aggregator.poll)
+                if states is not None and all(v == "FINISHED" for v in states.values()):
+                    break
+                await asyncio.sleep(poll_interval)
+        except asyncio.CancelledError:
+            if cancel_jobs:
+                await self.cancel()
+            raise
+        finally:
+            await self._in_thread(aggregator.save_state)
+        return aggregator
+
+    async def cancel(self, slurm_ids: Optional[List[str]] = None):
+        """
+        Cancel submitted tasks with scancel.
+
+        Parameters
+        ----------
+        slurm_ids : List[str], optional
+            Slurm IDs to cancel, by default every task submitted by the pool
+        """
+        if slurm_ids is None:
+            slurm_ids = list(self.slurm_ids.values())
+        if not slurm_ids:
+            return
+        self.logger.warning(f"Cancelling {len(slurm_ids)} tasks.")
+        await _run(["scancel", *slurm_ids])
+
+    async def plan(  # type: ignore[override]
+        self,
+        cmds: List[str],
+        job_name: str = "job",
+        costs: Optional[Sequence[float]] = None,
+        strategies: Optional[List[str]] = None,
+        node_speed: Optional[Dict[str, float]] = None,
+        task_overhead: float = 0.0,
+        seed: Optional[int] = None,
+    ) -> Dict[str, Dict]:
+        """
+        Predict how the commands would run, simulated in the default executor.
+
+        Parameters are the same as ``SlurmPool.plan``.
+
+        Returns
+        -------
+        Dict[str, Dict]
+            Predicted makespan, per-node utilization, critical task and critical
+            command of each strategy
+        """
+        return await self._in_thread(
+            super().plan,
+            cmds,
+            job_name,
+            costs,
+            strategies,
+            node_speed,
+            task_overhead,
+            seed,
+        )
+
+    @classmethod
+    async def clean(cls):  # type: ignore[override]
+        """Clean up the scripts and log files."""
+        await _run(["rm", "-rf", cls.dir_path])
+
+    async def map(self, func, params):  # type: ignore[override]
+        """
+        Submit a list of commands to the cluster.
+
+        Parameters
+        ----------
+        func : Callable
+            Function to call
+        params : Iterable
+            Parameters to pass to the function
+
+        Returns
+        -------
+        Dict[str, str]
+            Slurm ID of each task
+        """
+        cmds = [func(i) for i in params]
+        return await self.multi_submit(cmds, func.__name__)
+
+    async def starmap(self, func, params):  # type: ignore[override]
+        """
+        Submit a list of commands to the cluster.
+
+        Parameters
+        ----------
+        func : Callable
+            Function to call
+        params : Iterable[Iterable]
+            Parameters to pass to the function
+
+        Returns
+        -------
+        Dict[str, str]
+            Slurm ID of each task
+        """
+        cmds = [func(*i) for i in params]
+        return await self.multi_submit(cmds, func.__name__)
+
+    async def __aenter__(self):
+        """Enter the async context."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Exit the async context."""
+        self.close()
@@ -8,7 +8,7 @@ import time
 from collections import OrderedDict
 from pathlib import Path
 from subprocess import PIPE, run
-from typing import Callable, Dict, Iterable, List, Optional, Union
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
 from jinja2 import Environment, FileSystemLoader
 from rich.progress import (
@@ -19,6 +19,10 @@ from rich.progress import (
     TimeRemainingColumn,
 )
 
+from autosbatch.logs import CMD_MARKER
+from autosbatch.planner import STRATEGIES, chunk_bounds, simulate, slot_speeds
+from autosbatch.scores import NodeScores
+
 # from autosbatch.logger import logger
 
 
@@ -26,6 +30,9 @@ class SlurmPool:
     """A class for submitting jobs to Slurm."""
 
     dir_path = ".autosbatch"
+    time_format = "%m%d%H%M%S"
+
+    SINFO_COMMAND = ["sinfo", "-o", '"%n %e %m %a %c %C %O %R %t"']
 
     CPU_OpenMP_TEMPLATE = "CPU_OpenMP.j2"
 
@@ -37,6 +44,7 @@ class SlurmPool:
         node_list: Optional[List[str]] = None,
         partition: Optional[str] = None,
         max_pool_size: int = 1000,
+        use_scores: bool = False,
     ):
         """
         Initialize a SlurmPool object.
@@ -55,11 +63,45 @@ class SlurmPool:
             Partition to submit jobs to, by default None
         max_pool_size : int, optional
             Maximum number of jobs to submit, by default 1000
+        use_scores : bool, optional
+            Rank nodes by learned speed and live load, and size tasks in proportion
+            to the speed of their node, by default False
         """
         self.ncpus_per_job = ncpus_per_job
         self.logger = logging.getLogger("autosbatch")
         self.nodes = self.get_nodes()
+        self._init_pool(
+            pool_size=pool_size,
+            max_jobs_per_node=max_jobs_per_node,
+            node_list=node_list,
+            partition=partition,
+            max_pool_size=max_pool_size,
+            scores=NodeScores() if use_scores else None,
+        )
+
+    def _init_pool(
+        self,
+        pool_size: Optional[int],
+        max_jobs_per_node: Optional[int],
+        node_list: Optional[List[str]],
+        partition: Optional[str],
+        max_pool_size: int,
+        scores: Optional[NodeScores],
+    ):
+        """
+        Select nodes and size the pool, once ``self.nodes`` is queried.
+
+        Parameters are the same as ``__init__``, with the loaded ``scores``
+        instead of ``use_scores``.
+
+        Returns
+        -------
+        None
+        """
         self._get_avail_nodes(node_list=node_list, partition=partition)
+        self.scores = scores
+        if self.scores is not None:
+            self._sort_by_scores()
         self.node_list = list(self.nodes.keys())
         if len(self.node_list) == 0:
             raise RuntimeError("No Nodes are qualtified.")
@@ -72,7 +114,7 @@ class SlurmPool:
             for k, v in jobs_on_nodes.items()
         }
         self._set_pool_size(pool_size=pool_size, max_pool_size=max_pool_size)
-        self.time_now = datetime.datetime.now().strftime("%m%d%H%M%S")
+        self.time_now = datetime.datetime.now().strftime(self.time_format)
         self.file_dir = f"{self.dir_path}/{self.time_now}"
         self.log_dir = f"{self.file_dir}/log"
         self.scripts_dir = f"{self.file_dir}/scripts"
@@ -92,10 +134,30 @@ class SlurmPool:
         Dict
             Information of nodes, by default
         """
-        command = ["sinfo", "-o", '"%n %e %m %a %c %C %O %R %t"']
-        result = run(command, stdout=PIPE, stderr=PIPE, universal_newlines=True)
+        result = run(
+            cls.SINFO_COMMAND, stdout=PIPE, stderr=PIPE, universal_newlines=True
+        )
+        return cls._parse_sinfo(result.stdout, sortByload=sortByload)
+
+    @classmethod
+    def _parse_sinfo(cls, stdout: str, sortByload=True) -> Dict:
+        """
+        Parse the output of sinfo.
+
+        Parameters
+        ----------
+        stdout : str
+            Output of ``SINFO_COMMAND``
+        sortByload : bool, optional
+            Sort nodes by load, by default True
+
+        Returns
+        -------
+        Dict
+            Information of nodes
+        """
         nodes = {}
-        for line in result.stdout.splitlines():
+        for line in stdout.splitlines():
             line = line.strip('"')
             if line.startswith("HOSTNAMES"):
                 continue
@@ -186,6 +248,37 @@ class SlurmPool:
             k: v for k, v in self.nodes.items() if v["free_cpus"] >= self.ncpus_per_job
         }
 
+    def _sort_by_scores(self):
+        """
+        Sort nodes by the speed a new task would get, fastest first.
+
+        Returns
+        -------
+        None
+        """
+        self.nodes = dict(
+            sorted(
+                self.nodes.items(),
+                key=lambda x: self.scores.effective_speed(
+                    x[0], x[1], self.ncpus_per_job
+                ),
+                reverse=True,
+            )
+        )
+
+    def _node_speed(self) -> Optional[Dict[str, float]]:
+        """
+        Get the learned speed of nodes.
+
+        Returns
+        -------
+        Dict[str, float] or None
+            Speed of each node, None if node scores are not used
+        """
+        if self.scores is None:
+            return None
+        return {node: self.scores.speed(node) for node in self.nodes}
+
     def _set_max_jobs_per_node(
         self,
         max_jobs_per_node: Optional[int] = None,
@@ -253,6 +346,34 @@ class SlurmPool:
         else:
             self.pool_size = max_pool_size
 
+    def _allocate_tasks(self, pool_size: int) -> Dict[str, int]:
+        """
+        Allocate tasks to nodes, filling nodes in order.
+
+        Parameters
+        ----------
+        pool_size : int
+            Number of tasks to allocate
+
+        Returns
+        -------
+        Dict[str, int]
+            Number of tasks on each used node
+        """
+        used_nodes = {}
+        registed_jobs = 0
+        for k, v in self.jobs_on_nodes.items():
+            used_nodes[k] = v
+            registed_jobs += v
+            if registed_jobs < pool_size:
+                continue
+            elif registed_jobs == pool_size:
+                break
+            else:
+                used_nodes[k] -= registed_jobs - pool_size
+                break
+        return used_nodes
+
     def single_submit(
         self,
         partition: str,
@@ -282,9 +403,40 @@ class SlurmPool:
 
         Returns
         -------
-        None
+        str
+            Slurm ID of the job
         """
         # self.logger.setLevel(logging_level)
+        if isinstance(cmds, str):
+            cmds = [cmds]
+        script_path = self._write_script(partition, node, cpus_per_task, cmds, job_name)
+        command = ["sbatch", script_path]
+        result = run(command, stdout=PIPE, stderr=PIPE, universal_newlines=True)
+        slurm_id = result.stdout.strip().split()[-1]
+        self.logger.info(
+            f"Sumbitted Task: {job_name} to {node}, containing {len(cmds)} jobs. Slurm ID: {slurm_id}"
+        )
+        self.logger.debug(f"Commands: {cmds}")
+        return slurm_id
+
+    def _write_script(
+        self,
+        partition: str,
+        node: str,
+        cpus_per_task: int,
+        cmds: List[str],
+        job_name: str,
+    ) -> str:
+        """
+        Render the sbatch script of a job.
+
+        Parameters are the same as ``single_submit``.
+
+        Returns
+        -------
+        str
+            Path of the script
+        """
         Path(self.scripts_dir).mkdir(parents=True, exist_ok=True)
         Path(self.log_dir).mkdir(parents=True, exist_ok=True)
         templateLoader = FileSystemLoader(
@@ -293,28 +445,21 @@ class SlurmPool:
         env = Environment(loader=templateLoader)
         template = env.get_template(self.CPU_OpenMP_TEMPLATE)
 
-        if isinstance(cmds, str):
-            cmds = [cmds]
         output_from_parsed_template = template.render(
             job_name=job_name,
             partition=partition,
             node=node,
             cpus_per_task=cpus_per_task,
-            cmds="\n".join(cmds),
+            cmds=cmds,
             log_dir=self.log_dir,
+            marker=CMD_MARKER,
         )
         script_path = f"{self.scripts_dir}/{job_name}.sh"
         with open(script_path, "w") as f:
             f.write(output_from_parsed_template)
         command = ["chmod", "755", script_path]
         _ = run(command, stdout=PIPE, stderr=PIPE, universal_newlines=True)
-        command = ["sbatch", script_path]
-        result = run(command, stdout=PIPE, stderr=PIPE, universal_newlines=True)
-        slurm_id = result.stdout.strip().split()[-1]
-        self.logger.info(
-            f"Sumbitted Task: {job_name} to {node}, containing {len(cmds)} jobs. Slurm ID: {slurm_id}"
-        )
-        self.logger.debug(f"Commands: {cmds}")
+        return script_path
 
     def multi_submit(
         self,
@@ -349,6 +494,58 @@ class SlurmPool:
 
             random.shuffle(cmds)
         # self.logger.setLevel(logging_level)
+        used_nodes, tasks = self._prepare_tasks(cmds, job_name)
+        task_log = {}
+        with Progress(
+            TextColumn("{task.description}"),
+            BarColumn(),
+            MofNCompleteColumn(),
+            TimeRemainingColumn(),
+            auto_refresh=False,
+        ) as progress:
+            bars = {}
+            for ith, (task_name, node, start, end) in enumerate(tasks):
+                if node not in bars:
+                    self.logger.info(f"{node}: {used_nodes[node]} tasks")
+                    bars[node] = progress.add_task(
+                        f"Submitting to {node}...", total=used_nodes[node]
+                    )
+                time.sleep(sleep_time)
+                self.logger.info(f"Task {ith}: containing job {start}-{end - 1}")
+                slurm_id = self.single_submit(
+                    self.nodes[node]["partition"],
+                    node,
+                    self.ncpus_per_job,
+                    cmds[start:end],
+                    task_name,
+                    # logging_level,
+                )
+                progress.update(bars[node], advance=1)
+                progress.refresh()
+                task_log[task_name] = self._task_entry(
+                    task_name, node, cmds[start:end], slurm_id
+                )
+        self._write_task_log(task_log, shuffled=shuffle)
+
+    def _prepare_tasks(
+        self, cmds: List[str], job_name: str
+    ) -> Tuple[Dict[str, int], List[Tuple[str, str, int, int]]]:
+        """
+        Allocate tasks to nodes and split commands into tasks.
+
+        Parameters
+        ----------
+        cmds : List[str]
+            Commands to run
+        job_name : str
+            Name of the job
+
+        Returns
+        -------
+        Tuple[Dict[str, int], List[Tuple[str, str, int, int]]]
+            Number of tasks on each used node, and the name, node, start and end
+            index of the commands of each task
+        """
         self.logger.info(f"Found {len(self.nodes)} available nodes.")
         self.pool_size = min(self.pool_size, len(cmds))
         self.logger.info(
@@ -356,63 +553,152 @@ class SlurmPool:
         )
         self.logger.info(f"Each task will use {self.ncpus_per_job} cpus.")
 
-        used_nodes = {}
-        registed_jobs = 0
-        for k, v in self.jobs_on_nodes.items():
-            used_nodes[k] = v
-            registed_jobs += v
-            if registed_jobs < self.pool_size:
-                continue
-            elif registed_jobs == self.pool_size:
-                break
-            else:
-                used_nodes[k] -= registed_jobs - self.pool_size
-                break
+        used_nodes = self._allocate_tasks(self.pool_size)
         self.logger.info(f"Used {len(used_nodes)} nodes.")
         self.logger.info(
             f"Each node will excute {max(used_nodes.values())} tasks in parallel."
         )
         self.logger.info(f"{used_nodes}")
-        k, m = divmod(len(cmds), self.pool_size)
-        ith = 0
-        task_log = {}
-        with Progress(
-            TextColumn("{task.description}"),
-            BarColumn(),
-            MofNCompleteColumn(),
-            TimeRemainingColumn(),
-            auto_refresh=False,
-        ) as progress:
-            for node, n_jobs in used_nodes.items():
-                self.logger.info(f"{node}: {n_jobs} tasks")
-                task = progress.add_task(f"Submitting to {node}...", total=n_jobs)
-                for _ in range(n_jobs):
-                    time.sleep(sleep_time)
-                    start, end = ith * k + min(ith, m), (ith + 1) * k + min(ith + 1, m)
-                    self.logger.info(f"Task {ith}: containing job {start}-{end - 1}")
-                    task_name = f"{job_name}_{ith:>03}"
-                    self.single_submit(
-                        self.nodes[node]["partition"],
-                        node,
-                        self.ncpus_per_job,
-                        cmds[start:end],
-                        task_name,
-                        # logging_level,
-                    )
-                    progress.update(task, advance=1)
-                    progress.refresh()
-                    ith += 1
-                    task_log[task_name] = {
-                        "node": node,
-                        "script": f"{task_name}.sh",
-                        "stdout": f"{task_name}.out.log",
-                        "stderr": f"{task_name}.err.log",
-                        "cmd": cmds[start:end],
-                    }
+        weights = None
+        if self.scores is not None:
+            weights = slot_speeds(
+                self.nodes, used_nodes, self.ncpus_per_job, self._node_speed()
+            )
+        bounds = iter(chunk_bounds(len(cmds), self.pool_size, weights))
+        tasks: List[Tuple[str, str, int, int]] = []
+        for node, n_jobs in used_nodes.items():
+            for _ in range(n_jobs):
+                start, end = next(bounds)
+                tasks.append((f"{job_name}_{len(tasks):>03}", node, start, end))
+        return used_nodes, tasks
+
+    @staticmethod
+    def _task_entry(task_name: str, node: str, cmds: List[str], slurm_id: str) -> Dict:
+        """
+        Build the entry of a task in the task log.
+
+        Parameters
+        ----------
+        task_name : str
+            Name of the task
+        node : str
+            Node the task is submitted to
+        cmds : List[str]
+            Commands of the task
+        slurm_id : str
+            Slurm ID of the task
+
+        Returns
+        -------
+        Dict
+            Entry of the task
+        """
+        return {
+            "node": node,
+            "script": f"{task_name}.sh",
+            "stdout": f"{task_name}.out.log",
+            "stderr": f"{task_name}.err.log",
+            "cmd": cmds,
+            "slurm_id": slurm_id,
+        }
+
+    def _write_task_log(self, task_log: Dict, shuffled: bool = False):
+        """
+        Write the task log of the run.
+
+        Parameters
+        ----------
+        task_log : Dict
+            Entry of each task
+        shuffled : bool, optional
+            Commands were shuffled before being split into tasks, recorded in
+            each entry so that node speed can be learned from the run, by
+            default False
+
+        Returns
+        -------
+        None
+        """
+        for entry in task_log.values():
+            entry["shuffled"] = shuffled
         with open(f"{self.file_dir}/{self.time_now}.log", "w") as f:
             self.logger.info(f"Writing task log to {self.file_dir}/{self.time_now}.log")
             json.dump(task_log, f, indent=4)
 
+    def plan(
+        self,
+        cmds: List[str],
+        job_name: str = "job",
+        costs: Optional[Sequence[float]] = None,
+        strategies: Optional[List[str]] = None,
+        node_speed: Optional[Dict[str, float]] = None,
+        task_overhead: float = 0.0,
+        seed: Optional[int] = None,
+    ) -> Dict[str, Dict]:
+        """
+        Predict how the commands would run, without submitting anything.
+
+        Parameters
+        ----------
+        cmds : List[str]
+            Commands to run
+        job_name : str, optional
+            Name of the job, by default 'job'
+        costs : Sequence[float], optional
+            Estimated cost of each command in seconds, by default 1.0 for every command
+        strategies : List[str], optional
+            Placement strategies to compare, by default all of ``STRATEGIES``
+        node_speed : Dict[str, float], optional
+            Relative speed of each node, by default the learned node scores if
+            ``use_scores``, otherwise 1.0 for every node
+        task_overhead : float, optional
+            Seconds to schedule a task, array element or steal, by default 0.0
+        seed : int, optional
+            Seed of the shuffled strategy, by default None
+
+        Returns
+        -------
+        Dict[str, Dict]
+            Predicted makespan, per-node utilization, critical task and critical
+            command of each strategy
+        """
+        if costs is None:
+            costs = [1.0] * len(cmds)
+        if len(costs) != len(cmds):
+            raise ValueError("costs should have the same length as cmds.")
+        pool_size = min(self.pool_size, len(cmds))
+        used_nodes = self._allocate_tasks(pool_size)
+        self.logger.info(
+            f"{len(cmds):,} jobs to excute, allocated to {pool_size} tasks on {len(used_nodes)} nodes."
+        )
+        slot_nodes = [
+            node for node, n_jobs in used_nodes.items() for _ in range(n_jobs)
+        ]
+        speeds = slot_speeds(
+            self.nodes,
+            used_nodes,
+            self.ncpus_per_job,
+            node_speed or self._node_speed(),
+        )
+        results = {}
+        for strategy in strategies or STRATEGIES:
+            result = simulate(
+                costs,
+                slot_nodes,
+                speeds,
+                strategy,
+                task_overhead,
+                seed,
+                weighted=self.scores is not None,
+            )
+            result["critical_task"] = f"{job_name}_{result['critical_task']:>03}"
+            if result["critical_command"] >= 0:
+                result["critical_command"] = cmds[result["critical_command"]]
+            else:
+                result["critical_command"] = None
+            results[strategy] = result
+        return results
+
     def starmap(self, func: Callable, params: Iterable[Iterable]):
         """
         Submit a list of commands to the cluster.
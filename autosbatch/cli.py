@@ -1,17 +1,23 @@
 """Console script for autosbatch."""
 
 import logging
+import time
 from pathlib import Path
 from typing import List, Optional
 
 import typer
 from rich.console import Console
+from rich.table import Table
 
 from autosbatch import SlurmPool, __version__
+from autosbatch.logs import LogAggregator
+from autosbatch.scores import NodeScores
 
 # from autosbatch.logger import logger
 
 logger = logging.getLogger("autosbatch")
+# seconds between saves of the logs state while following a run
+SAVE_INTERVAL = 60.0
 
 CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
 app = typer.Typer(context_settings=CONTEXT_SETTINGS, add_completion=False)
@@ -75,12 +81,46 @@ def multi_job(
         None, "--partition", "-P", help="Partition to submit jobs to."
     ),
     job_name: str = typer.Option("job", "--job-name", "-j", help="Name of the job."),
+    dry_run: bool = typer.Option(
+        False,
+        "--dry-run",
+        help="Compare predicted makespan of placement strategies without submitting.",
+    ),
+    cost_file: Path = typer.Option(
+        None,
+        "--cost-file",
+        help="Estimated seconds of each command, one per line. Used with --dry-run.",
+    ),
+    task_overhead: float = typer.Option(
+        0.0,
+        "--task-overhead",
+        help="Seconds to schedule a task. Used with --dry-run.",
+    ),
+    use_scores: bool = typer.Option(
+        False,
+        "--use-scores",
+        "-s",
+        help="Give faster nodes more commands, using scores learned by the scores command.",
+    ),
+    shuffle: bool = typer.Option(
+        False,
+        "--shuffle",
+        help="Shuffle the commands, so that the scores command can learn node speed from the run.",
+    ),
     cmdfile: Path = typer.Argument(..., help="Path to the command file."),
 ):
     """Submit multiple jobs to slurm cluster."""
     with open(cmdfile, "r") as f:
-        cmds = f.readlines()
-    cmds = [cmd.strip() for cmd in cmds]
+        cmds = [cmd.strip() for cmd in f if cmd.strip()]
+    costs = None
+    if cost_file:
+        with open(cost_file, "r") as f:
+            costs = [float(line) for line in f if line.strip()]
+        if len(costs) != len(cmds):
+            raise typer.BadParameter(
+                f"{cost_file} has {len(costs)} costs for {len(cmds)} commands.",
+                param_hint="--cost-file",
+            )
 
     p = SlurmPool(
         pool_size=pool_size,
@@ -88,8 +128,142 @@ def multi_job(
         max_jobs_per_node=max_jobs_per_node,
         node_list=node_list,
         partition=partition,
+        use_scores=use_scores,
     )
-    p.multi_submit(cmds=cmds, job_name=job_name)
+    if dry_run:
+        plans = p.plan(
+            cmds=cmds, job_name=job_name, costs=costs, task_overhead=task_overhead
+        )
+        table = Table(title="Dry run")
+        for column in ["Strategy", "Makespan (s)", "Mean utilization", "Critical task"]:
+            table.add_column(column)
+        for strategy, plan in plans.items():
+            utilization = plan["utilization"].values()
+            table.add_row(
+                strategy,
+                f"{plan['makespan']:,.1f}",
+                f"{sum(utilization) / len(utilization):.1%}",
+                plan["critical_task"],
+            )
+        Console().print(table)
+        return
+    p.multi_submit(cmds=cmds, job_name=job_name, shuffle=shuffle)
+
+
+def _run_dir(run: str) -> Path:
+    """Resolve a run id or path to the directory of the run."""
+    run_dir = Path(run)
+    if not run_dir.is_dir():
+        run_dir = Path(SlurmPool.dir_path) / run
+    if not run_dir.is_dir():
+        raise typer.BadParameter(f"Run {run} not found.")
+    return run_dir
+
+
+def _logs_report(aggregator: LogAggregator, top: int) -> List[Table]:
+    """Build the tables reported by the logs command."""
+    counts = aggregator.summary()
+    summary = Table(title="Summary")
+    for key in counts:
+        summary.add_column(key.capitalize(), justify="right")
+    summary.add_row(*[f"{v:,}" for v in counts.values()])
+
+    failed = Table(title="Failed commands")
+    for column in ["Task", "Node", "Exit", "Command", "Last error"]:
+        failed.add_column(column)
+    for record in aggregator.failed()[:top]:
+        failed.add_row(
+            record["task"],
+            record["node"] or "",
+            str(record["returncode"]),
+            record["cmd"] or "",
+            record["errors"][-1] if record["errors"] else "",
+        )
+
+    slowest = Table(title="Slowest commands")
+    for column in ["Task", "Node", "Seconds", "Command"]:
+        slowest.add_column(column)
+    for record in aggregator.slowest(top):
+        slowest.add_row(
+            record["task"],
+            record["node"] or "",
+            f"{record['duration']:,}",
+            record["cmd"] or "",
+        )
+
+    errors = Table(title="Error signatures")
+    for column in ["Count", "Commands", "Example"]:
+        errors.add_column(column)
+    for group in aggregator.top_signatures(top):
+        errors.add_row(
+            f"{group['count']:,}", f"{group['n_commands']:,}", group["example"]
+        )
+    return [summary, failed, slowest, errors]
+
+
+@app.command()
+def logs(
+    run: str = typer.Argument(
+        ..., help="Run to inspect, e.g. 1219222144 or .autosbatch/1219222144."
+    ),
+    follow: bool = typer.Option(
+        False, "--follow", "-f", help="Keep polling until all tasks finish."
+    ),
+    interval: float = typer.Option(
+        2.0, "--interval", "-i", help="Seconds between polls in follow mode."
+    ),
+    timeout: float = typer.Option(
+        None, "--timeout", help="Stop following after this many seconds."
+    ),
+    top: int = typer.Option(10, "--top", "-t", help="Number of rows per table."),
+):
+    """Summarize failures and slow commands from the logs of a run."""
+    aggregator = LogAggregator(_run_dir(run))
+    console = Console()
+    if follow:
+        last_save = time.monotonic()
+        try:
+            for n_bytes in aggregator.follow(interval=interval, timeout=timeout):
+                if not n_bytes:
+                    continue
+                if time.monotonic() - last_save > SAVE_INTERVAL:
+                    aggregator.save_state()
+                    last_save = time.monotonic()
+                summary = aggregator.summary()
+                console.print(
+                    f"{summary['finished']:,}/{summary['commands']:,} commands finished, "
+                    f"{summary['failed']:,} failed."
+                )
+        finally:
+            aggregator.save_state()
+    else:
+        aggregator.update_queue()
+        aggregator.poll()
+        aggregator.save_state()
+    for table in _logs_report(aggregator, top):
+        console.print(table)
+
+
+@app.command()
+def scores(
+    runs: List[str] = typer.Argument(
+        None, help="Finished runs to learn node speed from, e.g. 1219222144."
+    ),
+):
+    """Learn node speed from finished runs and show the scores."""
+    node_scores = NodeScores()
+    for run in runs or []:
+        node_scores.update_from_run(_run_dir(run))
+    if runs:
+        node_scores.save()
+    table = Table(title="Node scores")
+    for column in ["Node", "Speed", "Runs"]:
+        table.add_column(column)
+    for node, score in sorted(
+        node_scores.nodes.items(), key=lambda x: x[1]["speed"], reverse=True
+    ):
+        table.add_row(node, f"{score['speed']:.2f}", str(score["runs"]))
+    Console().print(table)
 
 
 @app.command()
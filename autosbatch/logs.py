@@ -0,0 +1,506 @@
+"""Incremental aggregation of the task logs of a run."""
+
+import getpass
+import heapq
+import json
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from subprocess import PIPE, run
+from typing import Dict, Iterator, List, Optional, Set, Union
+
+CMD_MARKER = "#AUTOSBATCH"
+# return code of a command whose task was killed before the command ended
+KILLED = -1
+MAX_ERRORS_PER_CMD = 20
+MAX_COMMANDS_PER_SIGNATURE = 100
+MAX_SIGNATURE_LENGTH = 200
+
+_SIGNATURE_PATTERNS = [
+    (re.compile(r"'[^'\s]*'|\"[^\"]*\""), "<str>"),
+    (re.compile(r"(?:[\w.-]*/[\w.-]+)+/?"), "<path>"),
+    (re.compile(r"0x[0-9a-fA-F]+"), "<hex>"),
+    (re.compile(r"\d+(?:\.\d+)?"), "<n>"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def error_signature(line: str) -> str:
+    """
+    Normalize an error line into a signature shared by similar errors.
+
+    Quoted strings, paths, hex addresses and numbers are replaced by placeholders,
+    so that ``No such file: /data/a.txt`` and ``No such file: /data/b.txt`` are
+    grouped together.
+
+    Parameters
+    ----------
+    line : str
+        Error line
+
+    Returns
+    -------
+    str
+        Signature of the error line
+    """
+    signature = line.strip()
+    for pattern, placeholder in _SIGNATURE_PATTERNS:
+        signature = pattern.sub(placeholder, signature)
+    return signature[:MAX_SIGNATURE_LENGTH]
+
+
+class LogAggregator:
+    """Tail the stderr logs of all tasks of a run and index them by command."""
+
+    state_file = "logs.json"
+
+    def __init__(self, run_dir: Union[str, Path], use_state: bool = True):
+        """
+        Initialize a LogAggregator object.
+
+        Parameters
+        ----------
+        run_dir : str or Path
+            Directory of the run, e.g. ``.autosbatch/1219222144``
+        use_state : bool, optional
+            Resume from and save to the state file of the run, by default True
+        """
+        self.logger = logging.getLogger("autosbatch")
+        self.run_dir = Path(run_dir)
+        self.log_dir = self.run_dir / "log"
+        self.use_state = use_state
+        self.task_log = self.run_dir / f"{self.run_dir.name}.log"
+        self.tasks: Dict[str, Dict] = {}
+        self.files: Dict[str, Dict] = {}
+        self.commands: Dict[str, Dict] = {}
+        self.signatures: Dict[str, Dict] = {}
+        self._task_log_mtime: Optional[int] = None
+        self._dir_mtime: Optional[int] = None
+        self._last_scan = 0.0
+        if self.use_state:
+            self._load_state()
+        self._update_tasks()
+        if not self.tasks:
+            self.logger.warning(
+                f"Task log {self.task_log} not found, commands are unknown until it is written."
+            )
+
+    def _update_tasks(self):
+        """
+        Load the task log written by ``SlurmPool.multi_submit`` when it changes.
+
+        The task log is written once all tasks are submitted, so the logs of a
+        run may be read before it exists. Commands recorded before it appeared
+        are backfilled with their node and command line.
+
+        Returns
+        -------
+        None
+        """
+        try:
+            mtime = os.stat(self.task_log).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._task_log_mtime:
+            return
+        try:
+            with open(self.task_log, "r") as f:
+                self.tasks = json.load(f)
+        except ValueError:
+            # still being written, retry on the next poll
+            return
+        self._task_log_mtime = mtime
+        for record in self.commands.values():
+            info = self.tasks.get(record["task"], {})
+            cmds = info.get("cmd", [])
+            if record["node"] is None:
+                record["node"] = info.get("node")
+            if record["cmd"] is None and 0 <= record["index"] < len(cmds):
+                record["cmd"] = cmds[record["index"]]
+
+    def _load_state(self):
+        """Load offsets and indexes saved by a previous run of the aggregator."""
+        state_path = self.run_dir / self.state_file
+        if not state_path.exists():
+            return
+        with open(state_path, "r") as f:
+            state = json.load(f)
+        self.files = state["files"]
+        self.commands = state["commands"]
+        self.signatures = state["signatures"]
+        self.logger.info(f"Resumed from {state_path}.")
+
+    def save_state(self):
+        """Save offsets and indexes, so that the next aggregator only reads new bytes."""
+        if not self.use_state:
+            return
+        state_path = self.run_dir / self.state_file
+        with open(state_path, "w") as f:
+            json.dump(
+                {
+                    "files": self.files,
+                    "commands": self.commands,
+                    "signatures": self.signatures,
+                },
+                f,
+            )
+
+    def _scan_dir(self):
+        """
+        Register new stderr logs of the log directory, and reload the task log.
+
+        The directory is only listed when its mtime changes, since appending to
+        an existing log does not touch the directory.
+
+        Returns
+        -------
+        None
+        """
+        self._update_tasks()
+        try:
+            st = os.stat(self.log_dir)
+        except FileNotFoundError:
+            return
+        # files created in the same mtime tick as the last scan would be missed
+        if st.st_mtime_ns == self._dir_mtime and st.st_mtime < self._last_scan - 1:
+            return
+        self._dir_mtime = st.st_mtime_ns
+        self._last_scan = time.time()
+        with os.scandir(self.log_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".err.log") and entry.name not in self.files:
+                    self.files[entry.name] = self._new_file(
+                        entry.name[: -len(".err.log")]
+                    )
+
+    def poll(self) -> int:
+        """
+        Read the bytes appended to the stderr logs since the last poll.
+
+        Returns
+        -------
+        int
+            Number of bytes read
+        """
+        self._scan_dir()
+        n_bytes = 0
+        for name, file in self.files.items():
+            if not file["done"]:
+                n_bytes += self._read(name, file)
+        return n_bytes
+
+    def _read(self, name: str, file: Dict) -> int:
+        """
+        Read and parse the bytes appended to a stderr log since the last read.
+
+        Parameters
+        ----------
+        name : str
+            Name of the log file
+        file : Dict
+            State of the log file
+
+        Returns
+        -------
+        int
+            Number of bytes read
+        """
+        path = self.log_dir / name
+        try:
+            size = os.stat(path).st_size
+        except FileNotFoundError:
+            return 0
+        if size < file["offset"]:
+            self.logger.warning(f"{path} was truncated, reading from the start.")
+            file["offset"], file["partial"] = 0, ""
+        if size == file["offset"]:
+            return 0
+        with open(path, "rb") as f:
+            f.seek(file["offset"])
+            data = f.read(size - file["offset"])
+        file["offset"] += len(data)
+        lines = (file["partial"] + data.decode("utf-8", errors="replace")).split("\n")
+        file["partial"] = lines.pop()
+        for line in lines:
+            self._parse_line(file, line)
+        return len(data)
+
+    def _new_file(self, task: str) -> Dict:
+        """Get the initial state of the stderr log of a task."""
+        return {"task": task, "offset": 0, "partial": "", "current": -1, "done": False}
+
+    def _finish_task(self, task: str, returncode: int, end: Optional[int] = None):
+        """
+        Mark a task as finished, closing the command it was running.
+
+        Parameters
+        ----------
+        task : str
+            Name of the task
+        returncode : int
+            Return code of the running command
+        end : int, optional
+            End time of the running command, by default unknown
+
+        Returns
+        -------
+        None
+        """
+        file = self.files.setdefault(f"{task}.err.log", self._new_file(task))
+        if file["current"] >= 0:
+            record = self._command(task, file["current"])
+            record["returncode"], record["end"] = returncode, end
+            file["current"] = -1
+        file["done"] = True
+
+    def update_queue(self, queued: Optional[Set[str]] = None):
+        """
+        Finish the tasks that have left the slurm queue.
+
+        Tasks killed by slurm, e.g. on timeout or out of memory, never write
+        their exit marker. Once such a task has left the queue, the rest of its
+        log is read and the command it was running is marked as killed.
+
+        Parameters
+        ----------
+        queued : Set[str], optional
+            Slurm IDs still in the queue, by default queried from squeue
+
+        Returns
+        -------
+        None
+        """
+        if queued is None:
+            command = ["squeue", "-h", "-o", "%i", "-u", getpass.getuser()]
+            try:
+                result = run(command, stdout=PIPE, stderr=PIPE, universal_newlines=True)
+            except FileNotFoundError:
+                return
+            if result.returncode != 0:
+                self.logger.warning(f"squeue failed: {result.stderr.strip()}")
+                return
+            queued = set(result.stdout.split())
+        self._update_tasks()
+        for task, info in self.tasks.items():
+            if "slurm_id" not in info or info["slurm_id"] in queued:
+                continue
+            name = f"{task}.err.log"
+            file = self.files.setdefault(name, self._new_file(task))
+            if file["done"]:
+                continue
+            self._read(name, file)
+            if not file["done"]:
+                self.logger.info(f"Task {task} left the queue without exit marker.")
+                self._finish_task(task, KILLED)
+
+    def _command(self, task: str, index: int) -> Dict:
+        """
+        Get the record of a command, creating it if needed.
+
+        Parameters
+        ----------
+        task : str
+            Name of the task
+        index : int
+            Index of the command in the task, -1 for output outside any command
+
+        Returns
+        -------
+        Dict
+            Record of the command
+        """
+        key = f"{task}:{index}"
+        if key not in self.commands:
+            info = self.tasks.get(task, {})
+            cmds = info.get("cmd", [])
+            self.commands[key] = {
+                "task": task,
+                "index": index,
+                "node": info.get("node"),
+                "cmd": cmds[index] if 0 <= index < len(cmds) else None,
+                "start": None,
+                "end": None,
+                "returncode": None,
+                "n_errors": 0,
+                "errors": [],
+                "signatures": [],
+            }
+        return self.commands[key]
+
+    def _parse_line(self, file: Dict, line: str):
+        """
+        Parse a line of a stderr log.
+
+        Parameters
+        ----------
+        file : Dict
+            State of the log file
+        line : str
+            Line to parse
+
+        Returns
+        -------
+        None
+        """
+        task = file["task"]
+        if line.startswith(CMD_MARKER):
+            fields = line.split()
+            try:
+                if fields[1] == "START":
+                    file["current"] = int(fields[2])
+                    self._command(task, file["current"])["start"] = int(fields[3])
+                    return
+                if fields[1] == "END":
+                    record = self._command(task, int(fields[2]))
+                    record["returncode"] = int(fields[3])
+                    record["end"] = int(fields[4])
+                    # a background command may end after the next one started
+                    if file["current"] == record["index"]:
+                        file["current"] = -1
+                    return
+                if fields[1] == "EXIT":
+                    self._finish_task(task, int(fields[2]), int(fields[3]))
+                    return
+            except (IndexError, ValueError):
+                pass
+        if not line.strip():
+            return
+        record = self._command(task, file["current"])
+        record["n_errors"] += 1
+        if len(record["errors"]) < MAX_ERRORS_PER_CMD:
+            record["errors"].append(line)
+        signature = error_signature(line)
+        group = self.signatures.setdefault(
+            signature, {"count": 0, "example": line, "n_commands": 0, "commands": []}
+        )
+        group["count"] += 1
+        # each command is counted once per signature, whatever the interleaving
+        if signature not in record["signatures"]:
+            record["signatures"].append(signature)
+            group["n_commands"] += 1
+            if len(group["commands"]) < MAX_COMMANDS_PER_SIGNATURE:
+                group["commands"].append(f"{task}:{file['current']}")
+
+    def follow(
+        self,
+        interval: float = 2.0,
+        max_interval: float = 60.0,
+        timeout: Optional[float] = None,
+        check_queue: bool = True,
+    ) -> Iterator[int]:
+        """
+        Poll the logs until every task has finished.
+
+        Only unfinished logs are stat'ed on each poll, and the interval doubles
+        while nothing is written, so following a large run stays cheap.
+
+        Parameters
+        ----------
+        interval : float, optional
+            Initial time between polls in seconds, by default 2.0
+        max_interval : float, optional
+            Maximum time between polls in seconds, by default 60.0
+        timeout : float, optional
+            Stop following after this many seconds, by default no timeout
+        check_queue : bool, optional
+            Query squeue on each poll to finish killed tasks, by default True
+
+        Yields
+        ------
+        int
+            Number of bytes read by each poll
+        """
+        wait = interval
+        start = time.time()
+        while True:
+            if check_queue:
+                self.update_queue()
+            n_bytes = self.poll()
+            yield n_bytes
+            if self.finished:
+                break
+            if timeout is not None and time.time() - start > timeout:
+                self.logger.warning(f"Stopped following after {timeout} seconds.")
+                break
+            wait = interval if n_bytes else min(wait * 2, max_interval)
+            time.sleep(wait)
+
+    @property
+    def finished(self) -> bool:
+        """Whether all tasks in the task log have finished."""
+        if not self.tasks:
+            return False
+        return all(
+            self.files.get(f"{task}.err.log", {}).get("done", False)
+            for task in self.tasks
+        )
+
+    def failed(self) -> List[Dict]:
+        """
+        Get the commands that exited with a non-zero status or were killed.
+
+        Returns
+        -------
+        List[Dict]
+            Records of the failed commands
+        """
+        return [v for v in self.commands.values() if v["returncode"] not in (None, 0)]
+
+    def slowest(self, n: int = 10) -> List[Dict]:
+        """
+        Get the slowest finished commands.
+
+        Parameters
+        ----------
+        n : int, optional
+            Number of commands to return, by default 10
+
+        Returns
+        -------
+        List[Dict]
+            Records of the slowest commands, with their ``duration`` in seconds
+        """
+        finished = (
+            dict(v, duration=v["end"] - v["start"])
+            for v in self.commands.values()
+            if v["start"] is not None and v["end"] is not None
+        )
+        return heapq.nlargest(n, finished, key=lambda x: x["duration"])
+
+    def top_signatures(self, n: int = 10) -> List[Dict]:
+        """
+        Get the most frequent error signatures.
+
+        Parameters
+        ----------
+        n : int, optional
+            Number of signatures to return, by default 10
+
+        Returns
+        -------
+        List[Dict]
+            Signature groups, with their ``signature``, ``count``, ``example``,
+            ``n_commands`` and the first ``commands``
+        """
+        groups = (dict(v, signature=k) for k, v in self.signatures.items())
+        return heapq.nlargest(n, groups, key=lambda x: x["count"])
+
+    def summary(self) -> Dict:
+        """
+        Summarize the progress of the run.
+
+        Returns
+        -------
+        Dict
+            Number of tasks, started, finished and failed commands
+        """
+        records = [v for v in self.commands.values() if v["index"] >= 0]
+        return {
+            "tasks": len(self.tasks) or len(self.files),
+            "commands": sum(len(v.get("cmd", [])) for v in self.tasks.values()),
+            "started": sum(v["start"] is not None for v in records),
+            "finished": sum(v["end"] is not None for v in records),
+            "failed": len(self.failed()),
+        }
@@ -0,0 +1,333 @@
+"""Event-driven simulation of how commands would run on the allocated tasks."""
+
+import heapq
+import random
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+STRATEGIES = ["contiguous", "shuffled", "cost-balanced", "array", "work-stealing"]
+
+
+def chunk_bounds(
+    n_cmds: int, pool_size: int, weights: Optional[Sequence[float]] = None
+) -> List[Tuple[int, int]]:
+    """
+    Split commands into contiguous chunks, one per task.
+
+    Parameters
+    ----------
+    n_cmds : int
+        Number of commands
+    pool_size : int
+        Number of tasks
+    weights : Sequence[float], optional
+        Relative speed of each task, chunk sizes are proportional to it,
+        by default chunks of equal size
+
+    Returns
+    -------
+    List[Tuple[int, int]]
+        Start and end index of the commands of each task
+    """
+    if weights is None:
+        k, m = divmod(n_cmds, pool_size)
+        sizes = [k + 1 if ith < m else k for ith in range(pool_size)]
+    else:
+        total = sum(weights)
+        quotas = [n_cmds * w / total for w in weights]
+        sizes = [int(q) for q in quotas]
+        by_remainder = sorted(
+            range(pool_size), key=lambda i: quotas[i] - int(quotas[i]), reverse=True
+        )
+        for ith in by_remainder[: n_cmds - sum(sizes)]:
+            sizes[ith] += 1
+        # no task is left empty when there are enough commands
+        for ith in range(pool_size):
+            if sizes[ith] == 0 and n_cmds >= pool_size:
+                sizes[sizes.index(max(sizes))] -= 1
+                sizes[ith] += 1
+    ends = list(accumulate(sizes))
+    return [(end - size, end) for size, end in zip(sizes, ends)]
+
+
+def slot_speeds(
+    nodes: Dict,
+    used_nodes: Dict[str, int],
+    ncpus_per_job: int,
+    node_speed: Optional[Dict[str, float]] = None,
+) -> List[float]:
+    """
+    Get the speed of every task slot.
+
+    A slot runs at the speed of its node, slowed down when the load of the node
+    plus the cpus requested by our tasks exceeds the cpus of the node.
+
+    Parameters
+    ----------
+    nodes : Dict
+        Information of nodes, as returned by ``SlurmPool.get_nodes``
+    used_nodes : Dict[str, int]
+        Number of tasks on each used node
+    ncpus_per_job : int
+        Number of cpus per task
+    node_speed : Dict[str, float], optional
+        Relative speed of each node, by default 1.0 for every node
+
+    Returns
+    -------
+    List[float]
+        Speed of each slot, in the order of ``used_nodes``
+    """
+    node_speed = node_speed or {}
+    speeds = []
+    for node, n_jobs in used_nodes.items():
+        info = nodes[node]
+        demand = info["load"] + n_jobs * ncpus_per_job
+        contention = min(1.0, info["cpus"] / demand) if demand > 0 else 1.0
+        speeds.extend([node_speed.get(node, 1.0) * contention] * n_jobs)
+    return speeds
+
+
+def _result(
+    finish: List[float], busy: List[float], last_cmd: List[int], slot_nodes: List[str]
+) -> Dict:
+    """
+    Summarize the simulated finish time and busy time of every slot.
+
+    Parameters
+    ----------
+    finish : List[float]
+        Finish time of each slot
+    busy : List[float]
+        Time each slot spent running commands
+    last_cmd : List[int]
+        Index of the last command run by each slot, -1 if none
+    slot_nodes : List[str]
+        Node of each slot
+
+    Returns
+    -------
+    Dict
+        Predicted makespan, per-node utilization, critical task and critical command
+    """
+    critical = max(range(len(finish)), key=finish.__getitem__)
+    makespan = finish[critical]
+    node_busy: Dict[str, float] = {}
+    node_slots: Dict[str, int] = {}
+    for node, b in zip(slot_nodes, busy):
+        node_busy[node] = node_busy.get(node, 0.0) + b
+        node_slots[node] = node_slots.get(node, 0) + 1
+    return {
+        "makespan": makespan,
+        "utilization": {
+            k: v / (node_slots[k] * makespan) if makespan > 0 else 0.0
+            for k, v in node_busy.items()
+        },
+        "critical_task": critical,
+        "critical_command": last_cmd[critical],
+    }
+
+
+def _simulate_chunks(
+    costs: Sequence[float],
+    order: Optional[List[int]],
+    speeds: List[float],
+    task_overhead: float,
+    weights: Optional[Sequence[float]],
+):
+    """Each slot runs one contiguous chunk of ``order``, as ``multi_submit`` does."""
+    if order is not None:
+        costs = [costs[i] for i in order]
+    prefix = [0.0, *accumulate(costs)]
+    bounds = chunk_bounds(len(costs), len(speeds), weights)
+    finish, busy, last_cmd = [], [], []
+    for speed, (start, end) in zip(speeds, bounds):
+        run_time = (prefix[end] - prefix[start]) / speed
+        busy.append(run_time)
+        finish.append(task_overhead + run_time if end > start else 0.0)
+        if end > start:
+            last_cmd.append(order[end - 1] if order is not None else end - 1)
+        else:
+            last_cmd.append(-1)
+    return finish, busy, last_cmd
+
+
+def _simulate_queue(
+    costs: Sequence[float],
+    order: Iterable[int],
+    speeds: List[float],
+    task_overhead: float,
+    per_command: bool,
+):
+    """
+    Hand commands of ``order`` to the slot that becomes free first.
+
+    With ``per_command`` every command pays ``task_overhead``, as an element of a
+    job array; otherwise each slot pays it once.
+    """
+    pool_size = len(speeds)
+    finish = [0.0 if per_command else task_overhead] * pool_size
+    busy = [0.0] * pool_size
+    last_cmd = [-1] * pool_size
+    heap = [(finish[i], i) for i in range(pool_size)]
+    heapq.heapify(heap)
+    for i in order:
+        t, slot = heap[0]
+        run_time = costs[i] / speeds[slot]
+        t += run_time + (task_overhead if per_command else 0.0)
+        finish[slot] = t
+        busy[slot] += run_time
+        last_cmd[slot] = i
+        heapq.heapreplace(heap, (t, slot))
+    if not per_command:
+        finish = [t if c >= 0 else 0.0 for t, c in zip(finish, last_cmd)]
+    return finish, busy, last_cmd
+
+
+def _simulate_work_stealing(
+    costs: Sequence[float],
+    speeds: List[float],
+    task_overhead: float,
+    weights: Optional[Sequence[float]],
+):
+    """
+    Start from contiguous chunks and let idle slots steal work.
+
+    An idle slot takes half of the unstarted commands, rounded up, of the slot
+    expected to finish last. Chunks are index ranges over a prefix sum of the
+    costs, so a steal costs ``O(log n)`` whatever the size of the chunk.
+    """
+    pool_size = len(speeds)
+    prefix = [0.0, *accumulate(costs)]
+    lo, hi, t0 = [], [], []
+    finish = [0.0] * pool_size
+    busy = [0.0] * pool_size
+    last_cmd = [-1] * pool_size
+    version = [0] * pool_size
+    events, latest = [], []
+    bounds = chunk_bounds(len(costs), pool_size, weights)
+    for ith, (speed, (start, end)) in enumerate(zip(speeds, bounds)):
+        lo.append(start)
+        hi.append(end)
+        t0.append(task_overhead)
+        if end > start:
+            finish[ith] = task_overhead + (prefix[end] - prefix[start]) / speed
+            events.append((finish[ith], 0, ith))
+            latest.append((-finish[ith], 0, ith))
+    heapq.heapify(events)
+    heapq.heapify(latest)
+
+    while events:
+        t, ver, thief = heapq.heappop(events)
+        if ver != version[thief]:
+            continue
+        busy[thief] += (prefix[hi[thief]] - prefix[lo[thief]]) / speeds[thief]
+        last_cmd[thief] = hi[thief] - 1
+        finish[thief] = t
+        version[thief] += 1
+        skipped = []
+        while latest:
+            neg_finish, ver, victim = heapq.heappop(latest)
+            if ver != version[victim]:
+                continue
+            # commands up to the one running at time t stay with the victim
+            done = prefix[lo[victim]] + (t - t0[victim]) * speeds[victim]
+            running = bisect_right(prefix, done, lo[victim], hi[victim]) - 1
+            first_free = max(running + 1, lo[victim])
+            if hi[victim] - first_free < 1:
+                skipped.append((neg_finish, ver, victim))
+                continue
+            # the thief takes the larger half, down to a single command
+            mid = first_free + (hi[victim] - first_free) // 2
+            lo[thief], hi[thief], t0[thief] = mid, hi[victim], t + task_overhead
+            hi[victim] = mid
+            for slot in (victim, thief):
+                version[slot] += 1
+                t_end = t0[slot] + (prefix[hi[slot]] - prefix[lo[slot]]) / speeds[slot]
+                heapq.heappush(events, (t_end, version[slot], slot))
+                heapq.heappush(latest, (-t_end, version[slot], slot))
+            break
+        for item in skipped:
+            heapq.heappush(latest, item)
+    return finish, busy, last_cmd
+
+
+def simulate(
+    costs: Sequence[float],
+    slot_nodes: List[str],
+    speeds: List[float],
+    strategy: str = "contiguous",
+    task_overhead: float = 0.0,
+    seed: Optional[int] = None,
+    weighted: bool = False,
+) -> Dict:
+    """
+    Simulate running commands on task slots with a placement strategy.
+
+    Parameters
+    ----------
+    costs : Sequence[float]
+        Estimated cost of each command, in seconds on a node of speed 1.0
+    slot_nodes : List[str]
+        Node of each task slot
+    speeds : List[float]
+        Speed of each task slot, see ``slot_speeds``
+    strategy : str, optional
+        One of ``STRATEGIES``, by default 'contiguous'
+
+        - contiguous: each task runs a contiguous chunk of commands, as ``multi_submit``
+        - shuffled: same as contiguous, after shuffling the commands
+        - cost-balanced: longest command first to the task that becomes free first
+        - array: one job array element per command, in order
+        - work-stealing: contiguous chunks, idle tasks steal half of the remaining
+          commands of the task expected to finish last
+    task_overhead : float, optional
+        Seconds to schedule a task, array element or steal, by default 0.0
+    seed : int, optional
+        Seed of the shuffled strategy, by default None
+    weighted : bool, optional
+        Size contiguous chunks in proportion to the speed of each slot, as
+        ``multi_submit`` does with node scores, by default False
+
+    Returns
+    -------
+    Dict
+        Predicted makespan, per-node utilization, critical task and critical command
+    """
+    if len(slot_nodes) != len(speeds):
+        raise ValueError("slot_nodes and speeds should have the same length.")
+    if len(speeds) == 0:
+        raise ValueError("At least one task slot is required.")
+    if min(speeds) <= 0:
+        raise ValueError("speeds should be positive.")
+    weights = speeds if weighted else None
+    simulators: Dict[str, Callable] = {
+        "contiguous": lambda: _simulate_chunks(
+            costs, None, speeds, task_overhead, weights
+        ),
+        "shuffled": lambda: _simulate_chunks(
+            costs,
+            random.Random(seed).sample(range(len(costs)), len(costs)),
+            speeds,
+            task_overhead,
+            weights,
+        ),
+        "cost-balanced": lambda: _simulate_queue(
+            costs,
+            sorted(range(len(costs)), key=costs.__getitem__, reverse=True),
+            speeds,
+            task_overhead,
+            per_command=False,
+        ),
+        "array": lambda: _simulate_queue(
+            costs, range(len(costs)), speeds, task_overhead, per_command=True
+        ),
+        "work-stealing": lambda: _simulate_work_stealing(
+            costs, speeds, task_overhead, weights
+        ),
+    }
+    if strategy not in simulators:
+        raise ValueError(f"strategy should be one of {STRATEGIES}, got {strategy}.")
+    finish, busy, last_cmd = simulators[strategy]()
+    return _result(finish, busy, last_cmd, slot_nodes)
@@ -0,0 +1,180 @@
+"""Per-node speed scores learned from past command runtimes."""
+
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Union
+
+from autosbatch.logs import LogAggregator
+
+
+class NodeScores:
+    """Relative speed of each node, updated from the logs of finished runs."""
+
+    default_path = Path.home() / ".config" / "autosbatch" / "node_scores.json"
+
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        alpha: float = 0.3,
+        min_samples: int = 3,
+    ):
+        """
+        Initialize a NodeScores object.
+
+        Parameters
+        ----------
+        path : str or Path, optional
+            File to load the scores from and save them to, by default
+            ``~/.config/autosbatch/node_scores.json``, kept by ``SlurmPool.clean``
+        alpha : float, optional
+            Weight of a new run in the moving average of the speed, by default 0.3
+        min_samples : int, optional
+            Minimum number of commands run on a node to update its speed, by default 3
+        """
+        self.logger = logging.getLogger("autosbatch")
+        self.path = Path(path) if path else self.default_path
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.nodes: Dict[str, Dict] = {}
+        self.runs: List[str] = []
+        if self.path.exists():
+            with open(self.path, "r") as f:
+                scores = json.load(f)
+            self.nodes = scores["nodes"]
+            self.runs = scores["runs"]
+
+    def save(self):
+        """Save the scores."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump({"nodes": self.nodes, "runs": self.runs}, f, indent=4)
+
+    def speed(self, node: str) -> float:
+        """
+        Get the learned speed of a node.
+
+        Parameters
+        ----------
+        node : str
+            Name of the node
+
+        Returns
+        -------
+        float
+            Relative speed of the node, 1.0 if the node has never been observed
+        """
+        return self.nodes.get(node, {}).get("speed", 1.0)
+
+    def effective_speed(self, node: str, info: Dict, ncpus: int = 1) -> float:
+        """
+        Combine the learned speed of a node with its live load.
+
+        Parameters
+        ----------
+        node : str
+            Name of the node
+        info : Dict
+            Information of the node, as returned by ``SlurmPool.get_nodes``
+        ncpus : int, optional
+            Number of cpus of the task to place, by default 1
+
+        Returns
+        -------
+        float
+            Speed a new task would get on the node
+        """
+        demand = info["load"] + ncpus
+        return self.speed(node) * min(1.0, info["cpus"] / demand)
+
+    def update_from_run(self, run_dir: Union[str, Path]) -> Dict[str, float]:
+        """
+        Update the speed of nodes from the command runtimes of a run.
+
+        The runtime of a command depends on the node and on the command itself,
+        so runtimes are only compared between runs of the same work. By default
+        a command line is only used if it ran on at least two nodes of the run.
+        If the task log records that the commands were shuffled, e.g. with
+        ``multi_submit(shuffle=True)``, they were assigned to nodes at random and
+        every command is compared to the whole run. A contiguous run of distinct commands is not learned, since a
+        node given longer commands would look slower.
+
+        The cost of a command is its mean runtime scaled by the current speed of
+        the nodes that ran it, and the speed observed on a node is the cost of
+        its commands divided by their runtime. Observations are thus on the scale
+        of the current scores whichever nodes took part in the run, and a run
+        matching the current scores leaves them unchanged.
+
+        Only commands that finished with status 0 are used, so a run whose tasks
+        were killed, or that is still running, is learned from its finished
+        commands.
+
+        Parameters
+        ----------
+        run_dir : str or Path
+            Directory of the run, e.g. ``.autosbatch/1219222144``
+
+        Returns
+        -------
+        Dict[str, float]
+            Speed observed on each node in this run
+        """
+        run_dir = Path(run_dir)
+        if run_dir.name in self.runs:
+            self.logger.info(f"Run {run_dir.name} has already been learned.")
+            return {}
+        aggregator = LogAggregator(run_dir)
+        aggregator.poll()
+        aggregator.save_state()
+        if not aggregator.finished:
+            self.logger.warning(
+                f"Run {run_dir.name} has not finished, learning from its finished commands."
+            )
+        shuffled = bool(aggregator.tasks) and all(
+            v.get("shuffled", False) for v in aggregator.tasks.values()
+        )
+        samples = []
+        for record in aggregator.commands.values():
+            if record["node"] is None or record["cmd"] is None:
+                continue
+            if record["returncode"] != 0 or record["start"] is None:
+                continue
+            if record["end"] is None:
+                continue
+            key = "" if shuffled else record["cmd"]
+            samples.append((record["node"], key, record["end"] - record["start"]))
+        nodes_of: Dict[str, Set[str]] = {}
+        for node, key, _ in samples:
+            nodes_of.setdefault(key, set()).add(node)
+        samples = [x for x in samples if len(nodes_of[x[1]]) > 1]
+        if not samples:
+            self.logger.warning(
+                f"No command of run {run_dir.name} ran on several nodes, "
+                "submit with shuffle to learn from distinct commands."
+            )
+            return {}
+        costs: Dict[str, List[float]] = {}
+        for node, key, runtime in samples:
+            costs.setdefault(key, []).append(runtime * self.speed(node))
+        mean_cost = {k: sum(v) / len(v) for k, v in costs.items()}
+        # number of commands, total cost and total runtime on each node
+        totals: Dict[str, List[float]] = {}
+        for node, key, runtime in samples:
+            total = totals.setdefault(node, [0, 0.0, 0.0])
+            total[0] += 1
+            total[1] += mean_cost[key]
+            total[2] += runtime
+        observed = {}
+        for node, (n, cost, runtime) in totals.items():
+            if n < self.min_samples or cost == 0 or runtime == 0:
+                continue
+            observed[node] = cost / runtime
+            if node in self.nodes:
+                score = self.nodes[node]
+                score["speed"] += self.alpha * (observed[node] - score["speed"])
+                score["runs"] += 1
+            else:
+                self.nodes[node] = {"speed": observed[node], "runs": 1}
+        self.runs.append(run_dir.name)
+        self.logger.info(f"Learned speed of {len(observed)} nodes from {run_dir}.")
+        return observed
@@ -0,0 +1,34 @@
+"""Shared fixtures of the tests."""
+
+import json
+
+import pytest
+
+from autosbatch.logs import CMD_MARKER
+
+
+@pytest.fixture
+def make_run(tmp_path):
+    """
+    Get a factory creating the directory of a run.
+
+    The factory takes the task log of the run, e.g. ``{"job_000": {"node": "cpu01",
+    "cmd": ["echo a"]}}``, and optionally, for each task, the ``(index, start, end,
+    returncode)`` of its commands, written as markers to its stderr log followed by
+    an exit marker.
+    """
+
+    def _make_run(tasks, commands=None, name="0101000000"):
+        run_dir = tmp_path / name
+        (run_dir / "log").mkdir(parents=True)
+        for task, records in (commands or {}).items():
+            with open(run_dir / "log" / f"{task}.err.log", "w") as f:
+                for index, start, end, returncode in records:
+                    f.write(f"{CMD_MARKER} START {index} {start}\n")
+                    f.write(f"{CMD_MARKER} END {index} {returncode} {end}\n")
+                f.write(f"{CMD_MARKER} EXIT 0 {records[-1][2]}\n")
+        with open(run_dir / f"{name}.log", "w") as f:
+            json.dump(tasks, f)
+        return run_dir
+
+    return _make_run
@@ -0,0 +1,180 @@
+"""tests for async_pool.py."""
+
+import asyncio
+import json
+
+import pytest
+
+from autosbatch import async_pool
+from autosbatch.async_pool import AsyncSlurmPool, _run
+from autosbatch.scores import NodeScores
+
+
+def test_run():
+    """Test _run."""
+    assert asyncio.run(_run(["echo", "hello"])) == "hello\n"
+    with pytest.raises(RuntimeError):
+        asyncio.run(_run(["false"], check=True))
+
+
+def test_async_slurm_pool():
+    """Test AsyncSlurmPool."""
+    p = asyncio.run(AsyncSlurmPool.create())
+    assert p.pool_size == 1000
+    assert p.ncpus_per_job == 2
+    assert p.max_jobs_per_node == 76
+    assert len(p.node_list) == 54
+
+
+def test_async_slurm_pool_multi_submit():
+    """Test AsyncSlurmPool multi_submit."""
+
+    async def submit():
+        p = await AsyncSlurmPool.create(pool_size=2)
+        slurm_ids = await p.multi_submit(cmds=["echo hello"] * 4, job_name="test_job")
+        aggregator = await p.wait(poll_interval=1)
+        return slurm_ids, aggregator
+
+    slurm_ids, aggregator = asyncio.run(submit())
+    assert list(slurm_ids) == ["test_job_000", "test_job_001"]
+    assert aggregator.summary()["finished"] == 4
+
+
+def test_async_slurm_pool_multi_submit_failure(tmp_path, monkeypatch):
+    """Test that AsyncSlurmPool multi_submit stops and cleans up when sbatch fails."""
+    monkeypatch.setattr(AsyncSlurmPool, "dir_path", str(tmp_path))
+    nodes = AsyncSlurmPool._parse_sinfo("cpu01 1000 2000 up 8 0/8 0.0 cpu idle")
+    sbatch_calls, scancel_calls = [], []
+
+    async def exec_(command, check):
+        if command[0] == "scancel":
+            scancel_calls.append(command[1:])
+            return ""
+        sbatch_calls.append(command[1])
+        if len(sbatch_calls) == 6:
+            raise RuntimeError("sbatch failed")
+        return f"Submitted batch job {len(sbatch_calls)}"
+
+    monkeypatch.setattr(async_pool, "_exec", exec_)
+
+    async def submit():
+        p = AsyncSlurmPool(nodes, {}, pool_size=4)
+        first = await p.multi_submit(["echo hello"] * 4, "job", sleep_time=0.01)
+        with pytest.raises(RuntimeError):
+            await p.multi_submit(["echo hello"] * 4, "job", sleep_time=0.01)
+        return p, first
+
+    p, first = asyncio.run(submit())
+    assert first == {f"job_00{i}": str(i + 1) for i in range(4)}
+    # submission stops at the first failure, and only its own tasks are cancelled
+    assert len(sbatch_calls) == 6
+    assert scancel_calls == [["5"]]
+    with open(f"{p.file_dir}/{p.time_now}.log") as f:
+        assert {k: v["slurm_id"] for k, v in json.load(f).items()} == {"job_000": "5"}
+
+
+def test_async_slurm_pool_shared_semaphore(tmp_path, monkeypatch):
+    """Test that pools given the same semaphore bound their sbatch calls together."""
+    monkeypatch.setattr(AsyncSlurmPool, "dir_path", str(tmp_path))
+    nodes = AsyncSlurmPool._parse_sinfo("cpu01 1000 2000 up 8 0/8 0.0 cpu idle")
+    running, peak = [0], [0]
+
+    async def exec_(command, check):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+        return "Submitted batch job 100"
+
+    monkeypatch.setattr(async_pool, "_exec", exec_)
+
+    async def submit():
+        semaphore = asyncio.Semaphore(1)
+        pools = [AsyncSlurmPool(nodes, {}, semaphore=semaphore) for _ in range(2)]
+        assert pools[0].semaphore is pools[1].semaphore
+        await asyncio.gather(
+            *[
+                p.multi_submit(["echo hello"] * 2, f"job{i}", sleep_time=0)
+                for i, p in enumerate(pools)
+            ]
+        )
+
+    asyncio.run(submit())
+    assert peak[0] == 1
+
+
+def test_async_slurm_pool_wait(tmp_path, monkeypatch):
+    """Test AsyncSlurmPool with loaded scores, waiting for tasks that left the queue."""
+    monkeypatch.setattr(AsyncSlurmPool, "dir_path", str(tmp_path))
+    nodes = AsyncSlurmPool._parse_sinfo("cpu01 1000 2000 up 8 0/8 0.0 cpu idle")
+    scores = NodeScores(tmp_path / "node_scores.json")
+
+    async def exec_(command, check):
+        return "Submitted batch job 100" if command[0] == "sbatch" else ""
+
+    monkeypatch.setattr(async_pool, "_exec", exec_)
+
+    async def submit():
+        p = AsyncSlurmPool(nodes, {}, use_scores=True, scores=scores)
+        await p.multi_submit(["echo hello"] * 2, "job", shuffle=True, sleep_time=0)
+        return p, await p.wait(poll_interval=0)
+
+    p, aggregator = asyncio.run(submit())
+    assert p.scores is scores
+    assert aggregator.finished
+    assert all(v["shuffled"] for v in aggregator.tasks.values())
+
+
+def test_async_slurm_pool_wait_squeue_error(tmp_path, monkeypatch):
+    """Test that AsyncSlurmPool wait retries after a failed squeue call."""
+    monkeypatch.setattr(AsyncSlurmPool, "dir_path", str(tmp_path))
+    nodes = AsyncSlurmPool._parse_sinfo("cpu01 1000 2000 up 8 0/8 0.0 cpu idle")
+    squeue_calls = []
+
+    async def exec_(command, check):
+        if command[0] == "sbatch":
+            return "Submitted batch job 100"
+        squeue_calls.append(command)
+        if len(squeue_calls) == 1:
+            raise RuntimeError("squeue failed: slurm_load_jobs error")
+        return ""
+
+    monkeypatch.setattr(async_pool, "_exec", exec_)
+
+    async def submit():
+        p = AsyncSlurmPool(nodes, {})
+        await p.multi_submit(["echo hello"] * 2, "job", sleep_time=0)
+        return await p.wait(poll_interval=0)
+
+    aggregator = asyncio.run(submit())
+    assert len(squeue_calls) == 2
+    assert aggregator.finished
+    assert (tmp_path / aggregator.run_dir.name / "logs.json").exists()
+
+
+def test_async_slurm_pool_inherited(tmp_path, monkeypatch):
+    """Test the async versions of the methods inherited from SlurmPool."""
+    monkeypatch.setattr(AsyncSlurmPool, "dir_path", str(tmp_path / ".autosbatch"))
+    nodes = AsyncSlurmPool._parse_sinfo("cpu01 1000 2000 up 8 0/8 0.0 cpu idle")
+    exec_ = async_pool._exec
+
+    async def sbatch(command, check):
+        if command[0] == "sbatch":
+            return "Submitted batch job 100"
+        return await exec_(command, check)
+
+    monkeypatch.setattr(async_pool, "_exec", sbatch)
+
+    async def run_all():
+        p = AsyncSlurmPool(nodes, {})
+        slurm_id = await p.single_submit("cpu", "cpu01", 1, "echo hello", "job")
+        plans = await p.plan(["echo hello"] * 4, costs=[1.0] * 4)
+        await AsyncSlurmPool.clean()
+        return slurm_id, plans
+
+    slurm_id, plans = asyncio.run(run_all())
+    assert slurm_id == "100"
+    assert plans["contiguous"]["makespan"] == 1.0
+    assert not (tmp_path / ".autosbatch").exists()
+    with pytest.raises(RuntimeError):
+        AsyncSlurmPool.get_nodes()
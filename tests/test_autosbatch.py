@@ -69,3 +69,18 @@ def test_slurm_pool_single_submit():
     assert p.pool_size == 1000
     assert p.ncpus_per_job == 2
     assert p.max_jobs_per_node == 76
+
+
+def test_slurm_pool_plan():
+    """Test SlurmPool plan."""
+    p = SlurmPool()
+    plans = p.plan(cmds=["echo hello"] * 10, job_name="test_job", costs=[1.0] * 10)
+    assert list(plans) == [
+        "contiguous",
+        "shuffled",
+        "cost-balanced",
+        "array",
+        "work-stealing",
+    ]
+    assert plans["contiguous"]["makespan"] == 1.0
+    assert not Path(p.file_dir).exists()
@@ -38,3 +38,22 @@ def test_clean():
     result = runner.invoke(app, ["clean", "--help"])
     assert result.exit_code == 0
     assert "Show this message and exit." in result.stdout
+
+
+def test_multi_job_cost_file(tmp_path):
+    """Test multi_job with a cost file that does not match the commands."""
+    (tmp_path / "cmds.sh").write_text("echo a\n\necho b\n\n")
+    (tmp_path / "costs.txt").write_text("1.0\n")
+    runner = CliRunner()
+    result = runner.invoke(
+        app,
+        [
+            "multi-job",
+            "--dry-run",
+            "--cost-file",
+            str(tmp_path / "costs.txt"),
+            str(tmp_path / "cmds.sh"),
+        ],
+    )
+    assert result.exit_code == 2
+    assert "Invalid value for --cost-file" in result.output
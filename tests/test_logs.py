@@ -0,0 +1,160 @@
+"""tests for logs.py."""
+
+from autosbatch import logs
+from autosbatch.logs import CMD_MARKER, KILLED, LogAggregator, error_signature
+
+TASKS = {
+    "job_000": {"node": "cpu01", "cmd": ["echo a", "cat a.txt"], "slurm_id": "100"},
+    "job_001": {"node": "cpu02", "cmd": ["sleep 5", "cat b.txt"], "slurm_id": "101"},
+}
+
+
+def test_error_signature():
+    """Test error_signature."""
+    assert error_signature("cat: /data/a.txt: No such file") == error_signature(
+        "cat: /data/b.txt: No such file"
+    )
+    assert error_signature("exit 1") != error_signature("killed")
+
+
+def test_log_aggregator(make_run):
+    """Test LogAggregator."""
+    run_dir = make_run(TASKS)
+    with open(run_dir / "log" / "job_000.err.log", "w") as f:
+        f.write(f"{CMD_MARKER} START 0 100\n{CMD_MARKER} END 0 0 101\n")
+        f.write(f"{CMD_MARKER} START 1 101\ncat: /data/a.txt: No such file\n")
+        f.write(f"{CMD_MARKER} END 1 1 102\n{CMD_MARKER} EXIT 0 102\n")
+    with open(run_dir / "log" / "job_001.err.log", "w") as f:
+        f.write(f"{CMD_MARKER} START 0 100\n{CMD_MARKER} END 0 0 105\n")
+        f.write(f"{CMD_MARKER} START 1 105\ncat: /data/b.txt: No such")
+
+    aggregator = LogAggregator(run_dir)
+    assert aggregator.poll() > 0
+    assert [v["cmd"] for v in aggregator.failed()] == ["cat a.txt"]
+    assert aggregator.slowest(1)[0]["cmd"] == "sleep 5"
+    assert aggregator.files["job_000.err.log"]["done"]
+    assert not aggregator.finished
+    aggregator.save_state()
+
+    with open(run_dir / "log" / "job_001.err.log", "a") as f:
+        f.write(f" file\n{CMD_MARKER} END 1 1 106\n{CMD_MARKER} EXIT 0 106\n")
+    aggregator = LogAggregator(run_dir)
+    n_bytes = aggregator.poll()
+    assert n_bytes == len(f" file\n{CMD_MARKER} END 1 1 106\n{CMD_MARKER} EXIT 0 106\n")
+    assert aggregator.finished
+    assert len(aggregator.failed()) == 2
+    groups = aggregator.top_signatures()
+    assert len(groups) == 1
+    assert groups[0]["count"] == 2
+    assert groups[0]["commands"] == ["job_000:1", "job_001:1"]
+    assert groups[0]["n_commands"] == 2
+    assert aggregator.summary() == {
+        "tasks": 2,
+        "commands": 4,
+        "started": 4,
+        "finished": 4,
+        "failed": 2,
+    }
+
+
+def test_log_aggregator_killed(make_run):
+    """Test LogAggregator with tasks that exit early or are killed by slurm."""
+    run_dir = make_run(TASKS)
+    with open(run_dir / "log" / "job_000.err.log", "w") as f:
+        f.write(f"{CMD_MARKER} START 0 100\n{CMD_MARKER} EXIT 3 104\n")
+    with open(run_dir / "log" / "job_001.err.log", "w") as f:
+        f.write(f"{CMD_MARKER} START 0 100\n")
+
+    aggregator = LogAggregator(run_dir, use_state=False)
+    aggregator.update_queue(queued={"101"})
+    aggregator.poll()
+    assert not aggregator.finished
+    assert aggregator.failed()[0]["returncode"] == 3
+    assert aggregator.failed()[0]["end"] == 104
+
+    with open(run_dir / "log" / "job_001.err.log", "a") as f:
+        f.write("slurmstepd: error: Exceeded job memory limit\n")
+    aggregator.update_queue(queued=set())
+    assert aggregator.finished
+    assert aggregator.failed()[1]["returncode"] == KILLED
+    assert aggregator.failed()[1]["n_errors"] == 1
+    assert list(aggregator.follow(check_queue=False)) == [0]
+
+
+def test_log_aggregator_task_log(make_run, tmp_path):
+    """Test LogAggregator started before the task log is written."""
+    run_dir = make_run(TASKS)
+    task_log = run_dir / "0101000000.log"
+    task_log.rename(tmp_path / "task_log")
+    with open(run_dir / "log" / "job_000.err.log", "w") as f:
+        f.write(f"{CMD_MARKER} START 0 100\nerror\n{CMD_MARKER} EXIT 1 101\n")
+
+    aggregator = LogAggregator(run_dir)
+    aggregator.poll()
+    assert aggregator.failed()[0]["cmd"] is None
+    assert not aggregator.finished
+    aggregator.save_state()
+
+    (tmp_path / "task_log").rename(task_log)
+    aggregator.poll()
+    assert aggregator.failed()[0]["cmd"] == "echo a"
+    assert aggregator.failed()[0]["node"] == "cpu01"
+    assert aggregator.summary()["commands"] == 4
+
+    # records saved before the task log appeared are backfilled on resume
+    aggregator = LogAggregator(run_dir)
+    assert aggregator.failed()[0]["cmd"] == "echo a"
+
+
+def test_log_aggregator_background(make_run):
+    """Test LogAggregator with a background command ending after the next one started."""
+    run_dir = make_run(TASKS)
+    with open(run_dir / "log" / "job_001.err.log", "w") as f:
+        f.write(f"{CMD_MARKER} START 0 100\n{CMD_MARKER} START 1 105\n")
+        f.write(f"{CMD_MARKER} END 0 0 110\ncat: /data/b.txt: No such file\n")
+        f.write(f"{CMD_MARKER} END 1 1 111\n{CMD_MARKER} EXIT 0 111\n")
+
+    aggregator = LogAggregator(run_dir, use_state=False)
+    aggregator.poll()
+    assert aggregator.slowest(1)[0]["cmd"] == "sleep 5"
+    assert aggregator.failed()[0]["cmd"] == "cat b.txt"
+    assert aggregator.failed()[0]["n_errors"] == 1
+
+
+def test_log_aggregator_signature_cap(make_run, monkeypatch):
+    """Test that the commands of a signature group are capped."""
+    monkeypatch.setattr(logs, "MAX_COMMANDS_PER_SIGNATURE", 1)
+    run_dir = make_run(TASKS)
+    for task in ["job_000", "job_001"]:
+        with open(run_dir / "log" / f"{task}.err.log", "w") as f:
+            for i in range(2):
+                f.write(f"{CMD_MARKER} START {i} 100\nkilled\nkilled\n")
+
+    aggregator = LogAggregator(run_dir, use_state=False)
+    aggregator.poll()
+    group = aggregator.top_signatures(1)[0]
+    assert group["count"] == 8
+    assert group["n_commands"] == 4
+    assert len(group["commands"]) == 1
+
+
+def test_log_aggregator_signature_polls(make_run):
+    """Test that a command is counted once per signature over polls and resumes."""
+    run_dir = make_run(TASKS)
+    for task in ["job_000", "job_001"]:
+        with open(run_dir / "log" / f"{task}.err.log", "w") as f:
+            f.write(f"{CMD_MARKER} START 0 100\nwarning: low memory\n")
+    aggregator = LogAggregator(run_dir)
+    for ith in range(4):
+        if ith == 2:
+            aggregator.save_state()
+            aggregator = LogAggregator(run_dir)
+        aggregator.poll()
+        for task in ["job_000", "job_001"]:
+            with open(run_dir / "log" / f"{task}.err.log", "a") as f:
+                f.write("warning: low memory\n")
+    aggregator.poll()
+    group = aggregator.top_signatures(1)[0]
+    assert group["count"] == 10
+    assert group["n_commands"] == 2
+    assert sorted(group["commands"]) == ["job_000:0", "job_001:0"]
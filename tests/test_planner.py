@@ -0,0 +1,65 @@
+"""tests for planner.py."""
+
+import pytest
+
+from autosbatch.planner import STRATEGIES, chunk_bounds, simulate, slot_speeds
+
+
+def test_chunk_bounds():
+    """Test chunk_bounds."""
+    assert chunk_bounds(10, 3) == [(0, 4), (4, 7), (7, 10)]
+    assert chunk_bounds(10, 3, [2.0, 1.0, 1.0]) == [(0, 5), (5, 8), (8, 10)]
+    assert chunk_bounds(3, 3, [5.0, 0.01, 0.01]) == [(0, 1), (1, 2), (2, 3)]
+
+
+def test_slot_speeds():
+    """Test slot_speeds."""
+    nodes = {
+        "cpu01": {"cpus": 8, "load": 0.0},
+        "cpu02": {"cpus": 8, "load": 6.0},
+    }
+    speeds = slot_speeds(nodes, {"cpu01": 2, "cpu02": 2}, 2, {"cpu01": 2.0})
+    assert speeds == [2.0, 2.0, 0.8, 0.8]
+
+
+def test_simulate():
+    """Test simulate."""
+    costs = [4, 1, 1, 1, 1, 1, 1, 1]
+    results = {s: simulate(costs, ["a", "b"], [1.0, 1.0], s) for s in STRATEGIES}
+    assert results["contiguous"]["makespan"] == 7
+    assert results["contiguous"]["critical_task"] == 0
+    assert results["contiguous"]["critical_command"] == 3
+    assert results["contiguous"]["utilization"] == {"a": 1.0, "b": 4 / 7}
+    assert results["cost-balanced"]["makespan"] == 6
+    assert results["array"]["makespan"] == 6
+    assert results["work-stealing"]["makespan"] == 6
+    assert results["work-stealing"]["critical_command"] == 2
+    # the last unstarted command of a slot is stolen too
+    costs = [10, 1, 1, 1, 1, 1, 1, 1, 1, 1]
+    assert simulate(costs, ["a", "b"], [1.0, 1.0], "work-stealing")["makespan"] == 10
+
+
+def test_simulate_weighted():
+    """Test simulate with chunks weighted by speed."""
+    costs = [1] * 6
+    speeds = [2.0, 1.0]
+    assert simulate(costs, ["a", "b"], speeds, "contiguous")["makespan"] == 3
+    assert (
+        simulate(costs, ["a", "b"], speeds, "contiguous", weighted=True)["makespan"]
+        == 2
+    )
+
+
+def test_simulate_overhead():
+    """Test simulate with task overhead."""
+    costs = [1] * 4
+    assert simulate(costs, ["a", "a"], [1.0, 1.0], "contiguous", 1)["makespan"] == 3
+    assert simulate(costs, ["a", "a"], [1.0, 1.0], "array", 1)["makespan"] == 4
+
+
+def test_simulate_invalid():
+    """Test simulate with invalid arguments."""
+    with pytest.raises(ValueError):
+        simulate([1], ["a"], [1.0], "round-robin")
+    with pytest.raises(ValueError):
+        simulate([1], ["a"], [1.0, 1.0])
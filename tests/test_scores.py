@@ -0,0 +1,66 @@
+"""tests for scores.py."""
+
+from autosbatch.scores import NodeScores
+
+
+def _durations(durations):
+    """Get the task log and commands of a run with four commands per node."""
+    tasks, commands = {}, {}
+    for ith, (node, duration) in enumerate(durations.items()):
+        task = f"job_{ith:>03}"
+        tasks[task] = {"node": node, "cmd": [f"sleep {i}" for i in range(4)]}
+        commands[task] = [(i, i * duration, (i + 1) * duration, 0) for i in range(4)]
+    return tasks, commands
+
+
+def test_node_scores(make_run, tmp_path):
+    """Test NodeScores."""
+    scores = NodeScores(tmp_path / "node_scores.json", alpha=0.5)
+    assert scores.speed("cpu01") == 1.0
+    run_dir = make_run(*_durations({"cpu01": 10, "cpu02": 20}), name="0101000000")
+    assert scores.update_from_run(run_dir) == {"cpu01": 1.5, "cpu02": 0.75}
+    assert scores.update_from_run(run_dir) == {}
+    run_dir = make_run(*_durations({"cpu01": 10, "cpu02": 10}), name="0102000000")
+    # both nodes ran as fast as each other, although cpu01 is scored faster
+    assert scores.update_from_run(run_dir) == {"cpu01": 1.125, "cpu02": 1.125}
+    assert scores.speed("cpu01") == 1.3125
+    assert scores.nodes["cpu01"]["runs"] == 2
+    scores.save()
+
+    scores = NodeScores(tmp_path / "node_scores.json")
+    assert scores.speed("cpu02") == 0.9375
+    assert scores.runs == ["0101000000", "0102000000"]
+    info = {"cpus": 8, "load": 15.0}
+    assert scores.effective_speed("cpu02", info, ncpus=1) == 0.9375 / 2
+
+    # a run matching the scores leaves them unchanged
+    run_dir = make_run(*_durations({"cpu01": 4, "cpu02": 6}), name="0103000000")
+    scores.nodes = {
+        "cpu01": {"speed": 1.5, "runs": 1},
+        "cpu02": {"speed": 1.0, "runs": 1},
+    }
+    assert scores.update_from_run(run_dir) == {"cpu01": 1.5, "cpu02": 1.0}
+
+
+def test_node_scores_unfinished(make_run, tmp_path):
+    """Test NodeScores with a run whose last task never wrote its exit marker."""
+    tasks, commands = _durations({"cpu01": 10, "cpu02": 20})
+    tasks["job_002"] = {"node": "cpu03", "cmd": ["sleep 9"]}
+    run_dir = make_run(tasks, commands)
+    scores = NodeScores(tmp_path / "node_scores.json")
+    assert scores.update_from_run(run_dir) == {"cpu01": 1.5, "cpu02": 0.75}
+
+
+def test_node_scores_distinct_commands(make_run, tmp_path):
+    """Test NodeScores with a run of distinct commands."""
+    tasks, commands = _durations({"cpu01": 10, "cpu02": 20})
+    tasks["job_001"]["cmd"] = [f"sleep {i}" for i in range(4, 8)]
+    run_dir = make_run(tasks, commands)
+    scores = NodeScores(tmp_path / "node_scores.json")
+    assert scores.update_from_run(run_dir) == {}
+
+    # a shuffled run, as recorded by the task log, is compared across commands
+    for entry in tasks.values():
+        entry["shuffled"] = True
+    run_dir = make_run(tasks, commands, name="0102000000")
+    assert scores.update_from_run(run_dir) == {"cpu01": 1.5, "cpu02": 0.75}